@@ -1,11 +1,27 @@
 import os
 import time
 import json
-import math
+import queue
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional, Any, Tuple
-
-import requests
+from decimal import Decimal
+from typing import List, Dict, Optional, Any, Set, Tuple
+
+import numpy as np
+import orjson
+import urllib3
+import websocket
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+from scipy.signal import lfilter
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # optional: fall back to the NumPy/SciPy kernels
+    HAVE_NUMBA = False
 
 # =========================
 # CONFIG
@@ -16,13 +32,22 @@ TZ_OFFSET_HOURS = int(os.environ.get("TZ_OFFSET_HOURS", "2"))  # Ukraine +2 (win
 
 # Bybit public endpoints (no keys)
 BYBIT_BASE = "https://api.bybit.com"
+TG_BASE = "https://api.telegram.org"
+BYBIT_WS = "wss://stream.bybit.com/v5/public/linear"
 
 # Market universe (Bybit symbols)
 SYMBOLS = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "TONUSDT"]
 
+# Decimals to round prices to (Bybit tick size); other symbols are looked up once
+PRICE_DECIMALS = {"BTCUSDT": 1, "ETHUSDT": 2, "BNBUSDT": 2, "SOLUSDT": 3, "TONUSDT": 4}
+
 # Timeframes
 TF = "15"  # 15m klines
+TF_MS = int(TF) * 60_000
 CHECK_EVERY_SEC = 60  # scan once per minute
+KLINE_BUFFER = 300  # closed candles kept in memory per symbol
+WS_PING_SEC = 20  # Bybit drops idle streams without an app-level ping
+WS_STALE_SEC = 3 * WS_PING_SEC  # reconnect if not even a pong arrived for this long
 
 # Indicators
 EMA_FAST = 20
@@ -42,176 +67,667 @@ ATR_LEN = 14
 # Anti-spam / cooldown
 COOLDOWN_MIN = 90  # per symbol+side cooldown
 STATE_FILE = "state.json"
+SIGNALS_FILE = "signals-{month}.jsonl"  # append-only signal log, one file per UTC month
 
 # Daily stats time (local, by TZ offset)
 DAILY_STATS_HOUR = 21
 DAILY_STATS_MINUTE = 0
 
+# Kline cache for stats evaluation (many signals share a symbol)
+KLINE_CACHE_TTL_SEC = 60
+KLINE_CACHE_SIZE = 32
+STATS_KLINES_LIMIT = 200
+
+# Candle array columns (see bybit_klines)
+COL_T, COL_O, COL_H, COL_L, COL_C, COL_V = range(6)
+
+# Telegram batching (sendMessage text limit)
+TG_MAX_LEN = 4096
+TG_SEPARATOR = "\n\n---\n\n"
+
+# State file writes are coalesced to at most one per STATE_FLUSH_SEC
+STATE_FLUSH_SEC = 1.0
+
 # Request hardening
-HTTP_TIMEOUT = 12
+HTTP_TIMEOUT = urllib3.Timeout(connect=3, read=10)
+HTTP_KEEPALIVE_SEC = 30  # TCP keepalive probes keep idle sockets warm between scans
 RETRY_SLEEP = 2.0
 
+# =========================
+# HTTP
+# =========================
+def keepalive_socket_options() -> List[Tuple[int, int, int]]:
+    """Socket options for pooled connections: TCP keepalive probes on top of urllib3's defaults."""
+    opts = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if hasattr(socket, "TCP_KEEPIDLE"):  # Linux
+        opts += [
+            (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, HTTP_KEEPALIVE_SEC),
+            (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, HTTP_KEEPALIVE_SEC),
+            (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+        ]
+    return opts
+
+# One keep-alive connection pool per host (Bybit REST, Telegram): a TLS handshake
+# per host, not per request. Retries cover transient 429/5xx on idempotent
+# requests (GET); POSTs are only retried when the connection could not be made.
+HTTP = urllib3.PoolManager(
+    num_pools=2,
+    maxsize=16,
+    block=False,
+    timeout=HTTP_TIMEOUT,
+    retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+    socket_options=keepalive_socket_options(),
+)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 # =========================
 # TELEGRAM
 # =========================
+TG_SEND_URL = f"{TG_BASE}/bot{BOT_TOKEN}/sendMessage"
+
 def tg_send(text: str) -> None:
     if not BOT_TOKEN or not CHAT_ID:
         print("Missing BOT_TOKEN or CHAT_ID env vars")
         return
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": CHAT_ID,
         "text": text,
         "disable_web_page_preview": True,
     }
     try:
-        r = requests.post(url, json=payload, timeout=HTTP_TIMEOUT)
-        if r.status_code != 200:
-            print("Telegram error:", r.status_code, r.text[:300])
+        r = HTTP.request("POST", TG_SEND_URL, body=orjson.dumps(payload), headers=JSON_HEADERS)
+        if r.status != 200:
+            print("Telegram error:", r.status, r.data[:300])
     except Exception as e:
         print("Telegram exception:", e)
 
+# Messages waiting for tg_worker; the scanner never blocks on Telegram
+TG_QUEUE: "queue.Queue[str]" = queue.Queue()
+
+def tg_enqueue(text: str) -> None:
+    TG_QUEUE.put(text)
+
+def tg_worker() -> None:
+    while True:
+        tg_send(TG_QUEUE.get())
+
+def tg_send_batch(texts: List[str]) -> None:
+    """Queue several messages as few sendMessage calls as TG_MAX_LEN allows."""
+    batch = ""
+    for text in texts:
+        if batch and len(batch) + len(TG_SEPARATOR) + len(text) > TG_MAX_LEN:
+            tg_enqueue(batch)
+            batch = ""
+        batch = f"{batch}{TG_SEPARATOR}{text}" if batch else text
+    if batch:
+        tg_enqueue(batch)
+
 # =========================
 # STATE
 # =========================
+# Set whenever `state` changes; the scanner writes state.json only when set
+_state_dirty = False
+# Serialized state snapshots waiting for state_worker
+STATE_QUEUE: "queue.Queue[bytes]" = queue.Queue()
+
+def mark_dirty() -> None:
+    global _state_dirty
+    _state_dirty = True
+
 def load_state() -> Dict[str, Any]:
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(STATE_FILE, "rb") as f:
+            state = orjson.loads(f.read())
+        if "signals" in state:  # pre-log state files kept the history inline
+            append_signals(state.pop("signals"))
+            save_state(state)
+        return state
     except Exception:
         return {
             "last_sent": {},     # key -> unix ts
-            "signals": [],       # list of signals (for stats)
             "daily": {"last_stats_date": ""}  # YYYY-MM-DD
         }
 
 def save_state(state: Dict[str, Any]) -> None:
+    """Snapshot `state` now; the file itself is written by state_worker."""
+    global _state_dirty
     try:
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        STATE_QUEUE.put(orjson.dumps(state, option=orjson.OPT_SERIALIZE_NUMPY))
+        _state_dirty = False
     except Exception as e:
         print("save_state error:", e)
 
+def write_state_file(data: bytes) -> None:
+    tmp = STATE_FILE + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, STATE_FILE)  # atomic: never leave a half-written state.json
+    except Exception as e:
+        print("write_state_file error:", e)
+
+def state_worker() -> None:
+    while True:
+        data = STATE_QUEUE.get()
+        # only the newest snapshot matters
+        while True:
+            try:
+                data = STATE_QUEUE.get_nowait()
+            except queue.Empty:
+                break
+        write_state_file(data)
+        time.sleep(STATE_FLUSH_SEC)
+
 def cooldown_ok(state: Dict[str, Any], key: str, now_ts: int) -> bool:
     last = int(state.get("last_sent", {}).get(key, 0))
     return (now_ts - last) >= (COOLDOWN_MIN * 60)
 
 def mark_sent(state: Dict[str, Any], key: str, now_ts: int) -> None:
     state.setdefault("last_sent", {})[key] = now_ts
+    mark_dirty()
+
+def signals_file(ts: int) -> str:
+    return SIGNALS_FILE.format(month=datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m"))
+
+def append_signals(sigs: List[Dict[str, Any]]) -> None:
+    """Append signals (for stats) to the log; O(new signals) instead of rewriting history."""
+    for sig in sigs:
+        try:
+            with open(signals_file(int(sig["ts"])), "ab") as f:
+                f.write(orjson.dumps(sig, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+        except Exception as e:
+            print("append_signals error:", e)
+
+def load_signals(start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+    """Signals with start_ts <= ts < end_ts, read from the monthly logs covering that range."""
+    out = []
+    for path in sorted({signals_file(start_ts), signals_file(end_ts - 1)}):
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    sig = orjson.loads(line)
+                    if start_ts <= int(sig.get("ts", 0)) < end_ts:
+                        out.append(sig)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print("load_signals error:", path, e)
+    return out
 
 # =========================
 # BYBIT DATA
 # =========================
-def bybit_klines(symbol: str, interval: str, limit: int = 200) -> List[Dict[str, float]]:
+# Kline fetches are network-bound; run them for all symbols at once (seeding, stats)
+SCAN_POOL = ThreadPoolExecutor(max_workers=len(SYMBOLS))
+
+# Kline URLs with the query string already encoded, keyed by (symbol, interval, limit).
+# Seed and stats fetches are prebuilt at import; backfill limits are added on first use.
+KLINE_URLS: Dict[Tuple[str, str, int], str] = {}
+
+def kline_url(symbol: str, interval: str, limit: int) -> str:
+    key = (symbol, interval, limit)
+    url = KLINE_URLS.get(key)
+    if url is None:
+        url = KLINE_URLS[key] = (
+            f"{BYBIT_BASE}/v5/market/kline?category=linear"
+            f"&symbol={symbol}&interval={interval}&limit={limit}"
+        )
+    return url
+
+for _s in SYMBOLS:
+    kline_url(_s, TF, KLINE_BUFFER + 1)
+    kline_url(_s, TF, STATS_KLINES_LIMIT)
+
+def bybit_klines(symbol: str, interval: str, limit: int = 200) -> np.ndarray:
     """
-    Returns list of candles oldest->newest.
+    Returns candles oldest->newest as a float64 array of shape (n, 6),
+    columns COL_T..COL_V = (t, o, h, l, c, v).
     Bybit v5 market/kline returns:
     list: [ [start, open, high, low, close, volume, turnover], ... ]
     start is ms.
     """
-    url = f"{BYBIT_BASE}/v5/market/kline"
-    params = {
-        "category": "linear",
-        "symbol": symbol,
-        "interval": interval,
-        "limit": str(limit),
-    }
+    url = kline_url(symbol, interval, limit)
     for _ in range(3):
         try:
-            r = requests.get(url, params=params, timeout=HTTP_TIMEOUT)
-            if r.status_code != 200:
-                print("Bybit HTTP error", r.status_code, r.text[:200])
+            r = HTTP.request("GET", url)
+            if r.status != 200:
+                print("Bybit HTTP error", r.status, r.data[:200])
                 time.sleep(RETRY_SLEEP)
                 continue
-            data = r.json()
+            data = orjson.loads(r.data)
             if data.get("retCode") != 0:
                 print("Bybit retCode error", data.get("retCode"), data.get("retMsg"))
                 time.sleep(RETRY_SLEEP)
                 continue
             raw = data["result"]["list"]
-            candles = []
-            # raw is newest->oldest; convert to oldest->newest
-            for row in reversed(raw):
-                candles.append({
-                    "t": int(row[0]),
-                    "o": float(row[1]),
-                    "h": float(row[2]),
-                    "l": float(row[3]),
-                    "c": float(row[4]),
-                    "v": float(row[5]),
-                })
-            return candles
+            if not raw:
+                return np.empty((0, 6))
+            # raw is newest->oldest; convert to oldest->newest, drop turnover.
+            # One C-level str->float pass over all rows (no per-field float()).
+            # Column-major so each column is a contiguous float64 array.
+            return np.asfortranarray(np.asarray(raw[::-1], dtype=np.float64)[:, :6])
         except Exception as e:
             print("Bybit exception:", e)
             time.sleep(RETRY_SLEEP)
-    return []
+    return np.empty((0, 6))
+
+def price_decimals(symbol: str) -> int:
+    """Decimals for `symbol` prices: PRICE_DECIMALS, else Bybit's tickSize (cached)."""
+    dec = PRICE_DECIMALS.get(symbol)
+    if dec is not None:
+        return dec
+    url = f"{BYBIT_BASE}/v5/market/instruments-info"
+    try:
+        r = HTTP.request("GET", url, fields={"category": "linear", "symbol": symbol})
+        tick = orjson.loads(r.data)["result"]["list"][0]["priceFilter"]["tickSize"]
+        dec = max(0, -Decimal(tick).normalize().as_tuple().exponent)
+    except Exception as e:
+        print("Bybit instruments-info error:", symbol, e)
+        return 6  # not cached; retried on the next signal
+    PRICE_DECIMALS[symbol] = dec
+    return dec
+
+# (symbol, interval, limit) -> (expires_at, candles); insertion order == FIFO order
+KLINE_CACHE: Dict[Tuple[str, str, int], Tuple[float, np.ndarray]] = {}
+KLINE_CACHE_LOCK = threading.Lock()
+
+def recent_klines(symbol: str, interval: str, limit: int = 200) -> np.ndarray:
+    """
+    bybit_klines memoized for KLINE_CACHE_TTL_SEC, oldest entry evicted first.
+    Failed (empty) fetches are not cached. Not for stream seeding, which must be fresh.
+    """
+    key = (symbol, interval, limit)
+    now = time.time()
+    with KLINE_CACHE_LOCK:
+        hit = KLINE_CACHE.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    candles = bybit_klines(symbol, interval, limit)
+    if len(candles):
+        with KLINE_CACHE_LOCK:
+            KLINE_CACHE.pop(key, None)
+            KLINE_CACHE[key] = (now + KLINE_CACHE_TTL_SEC, candles)
+            while len(KLINE_CACHE) > KLINE_CACHE_SIZE:
+                del KLINE_CACHE[next(iter(KLINE_CACHE))]
+    return candles
+
+# =========================
+# BYBIT STREAM
+# =========================
+class CandleRing:
+    """
+    Fixed-capacity buffer of closed candles. push() writes one row in place and
+    overwrites the oldest once full; tail()/view() return ordered copies
+    (oldest->newest, column-major) that stay valid after the lock is released.
+    """
+    __slots__ = ("buf", "n", "cap")
+
+    def __init__(self, candles: np.ndarray, cap: int = KLINE_BUFFER):
+        self.cap = cap
+        self.buf = np.empty((cap, 6), order="F")
+        keep = candles[-cap:]
+        self.buf[:len(keep)] = keep
+        self.n = len(keep)
+
+    def __len__(self) -> int:
+        return min(self.n, self.cap)
+
+    def push(self, row: np.ndarray) -> None:
+        self.buf[self.n % self.cap] = row
+        self.n += 1
+
+    def last_t(self) -> float:
+        return float(self.buf[(self.n - 1) % self.cap, COL_T])
+
+    def tail(self, k: int) -> np.ndarray:
+        k = min(k, len(self))
+        out = np.empty((k, 6), order="F")
+        end = self.n % self.cap
+        start = end - k
+        if start >= 0:
+            out[:] = self.buf[start:end]
+        else:
+            out[:-start] = self.buf[start:]
+            out[-start:] = self.buf[:end]
+        return out
+
+    def view(self) -> np.ndarray:
+        return self.tail(self.cap)
+
+# Closed candles per symbol (oldest->newest, at most KLINE_BUFFER rows), the
+# currently forming candle and the indicator state over the closed candles.
+# Written by the stream thread, read by the scanner.
+CANDLES: Dict[str, CandleRing] = {}
+LIVE: Dict[str, Optional[np.ndarray]] = {}
+IND: Dict[str, "IndicatorState"] = {}
+# Symbols whose buffers line up with the stream on the current connection;
+# the others are ignored by the stream and the scanner until (re)seeded
+SEEDED: Set[str] = set()
+BUF_LOCK = threading.Lock()
+# Set when any symbol's candle closes so the scanner runs right away
+CANDLE_CLOSED = threading.Event()
+
+def fetch_seed(symbol: str) -> Tuple[np.ndarray, bool]:
+    """
+    Candles to (re)fill the buffer with, forming candle last, and whether the
+    held indicator state may be rolled forward over them. After a reconnect
+    only the candles missed while disconnected are fetched and joined onto the
+    buffer; a cold start (or a gap longer than the buffer) fetches it all. A
+    buffer with a hole in it is refetched in full and its indicators re-warmed.
+    """
+    with BUF_LOCK:
+        ring = CANDLES.get(symbol)
+        have = ring.view() if ring is not None else None
+    if have is not None and len(have) and not np.all(np.diff(have[:, COL_T]) == TF_MS):
+        print("Candle buffer has gaps, refetching:", symbol)
+        return bybit_klines(symbol, TF, limit=KLINE_BUFFER + 1), False
+    if have is not None and len(have):
+        last_t = have[-1, COL_T]
+        missing = int((time.time() * 1000 - last_t) // TF_MS)
+        if missing < KLINE_BUFFER:
+            # +1 overlap so we can tell the new candles join up with the buffer
+            fresh = bybit_klines(symbol, TF, limit=missing + 2)
+            if len(fresh) and fresh[0, COL_T] <= last_t:
+                newer = fresh[fresh[:, COL_T] > last_t]
+                return np.asfortranarray(np.concatenate((have, newer))[-(KLINE_BUFFER + 1):]), True
+    return bybit_klines(symbol, TF, limit=KLINE_BUFFER + 1), True
+
+def seed_candles(saved: Dict[str, Dict[str, float]], symbols: List[str]) -> None:
+    """
+    Prefill the buffers from REST; the newest REST candle is still forming.
+    Indicator state is rolled forward from the in-memory (reconnect) or saved
+    (restart) state when it lines up with the candles, else warmed up.
+    Symbols that get no candles stay out of SEEDED for the caller to retry.
+    """
+    fetched = SCAN_POOL.map(fetch_seed, symbols)
+    for sym, (candles, resumable) in zip(symbols, fetched):
+        if not len(candles):
+            print("Seed failed, will retry:", sym)
+            continue
+        closed = candles[:-1]
+        with BUF_LOCK:
+            prev = IND.get(sym)
+            # roll a copy forward: the scanner reads IND[sym] until the new
+            # candles are published below, together with it
+            if prev is not None:
+                prev = IndicatorState.from_dict(prev.to_dict())
+        if prev is None and sym in saved:
+            prev = IndicatorState.from_dict(saved[sym])
+        ind = IndicatorState.resume(prev if resumable else None, closed)
+        with BUF_LOCK:
+            CANDLES[sym] = CandleRing(closed)
+            LIVE[sym] = candles[-1]
+            if ind is not None:
+                IND[sym] = ind
+            SEEDED.add(sym)
+
+def on_kline(symbol: str, k: Dict[str, Any]) -> None:
+    row = np.array([k["start"], k["open"], k["high"], k["low"], k["close"], k["volume"]], dtype=np.float64)
+    with BUF_LOCK:
+        closed = CANDLES.get(symbol)
+        if closed is None or symbol not in SEEDED:
+            return
+        if len(closed) and row[COL_T] <= closed.last_t():
+            return  # already have it (replayed after reconnect/seed)
+        if len(closed) and row[COL_T] != closed.last_t() + TF_MS:
+            # a close went missing: don't join across the gap, reseed instead
+            print("Kline gap, reseeding:", symbol)
+            SEEDED.discard(symbol)
+            LIVE[symbol] = None
+            return
+        if k.get("confirm"):
+            closed.push(row)
+            LIVE[symbol] = None
+            ind = IND.get(symbol)
+            if ind is not None:
+                ind.update(row[COL_C], row[COL_T])
+            CANDLE_CLOSED.set()
+        else:
+            LIVE[symbol] = row
+
+def indicator_snapshot() -> Dict[str, Dict[str, float]]:
+    with BUF_LOCK:
+        return {sym: ind.to_dict() for sym, ind in IND.items()}
+
+def ws_loop(saved: Dict[str, Dict[str, float]]) -> None:
+    topics = [f"kline.{TF}.{s}" for s in SYMBOLS]
+    while True:
+        ws = None
+        try:
+            ws = websocket.create_connection(BYBIT_WS, timeout=WS_PING_SEC)
+            ws.send(json.dumps({"op": "subscribe", "args": topics}))
+            ack = orjson.loads(ws.recv())
+            if ack.get("op") != "subscribe" or not ack.get("success"):
+                raise RuntimeError(f"subscribe failed: {ack}")
+            # seed after subscribing so no candle falls between REST and stream
+            seed_candles(saved, SYMBOLS)
+            last_ping = last_msg = time.time()
+            while True:
+                try:
+                    msg = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    msg = None
+                if msg:
+                    last_msg = time.time()
+                elif time.time() - last_msg >= WS_STALE_SEC:
+                    raise RuntimeError(f"no messages for {time.time() - last_msg:.0f}s")
+                if time.time() - last_ping >= WS_PING_SEC:
+                    ws.send(json.dumps({"op": "ping"}))
+                    unseeded = [s for s in SYMBOLS if s not in SEEDED]
+                    if unseeded:
+                        seed_candles(saved, unseeded)
+                    last_ping = time.time()
+                if not msg:
+                    continue
+                data = orjson.loads(msg)
+                topic = data.get("topic", "")
+                if not topic.startswith("kline."):
+                    continue
+                symbol = topic.rsplit(".", 1)[1]
+                for k in data.get("data", []):
+                    on_kline(symbol, k)
+        except Exception as e:
+            print("Bybit WS exception:", e)
+            # no live data until reseeded: don't let the scanner keep
+            # evaluating the last price while the stream is down
+            with BUF_LOCK:
+                SEEDED.clear()
+                for sym in LIVE:
+                    LIVE[sym] = None
+            time.sleep(RETRY_SLEEP)
+        finally:
+            if ws is not None:
+                ws.close()
 
 # =========================
 # INDICATORS
 # =========================
-def ema(values: List[float], length: int) -> List[float]:
-    if len(values) < length:
-        return []
+if HAVE_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _indicators_nb(close, nf, ns, nr):
+        # both EMAs (seeded with close[0]) and the Wilder gain/loss averages in one pass
+        kf = 2.0 / (nf + 1)
+        ks = 2.0 / (ns + 1)
+        ef = close[0]
+        es = close[0]
+        avg_gain = 0.0
+        avg_loss = 0.0
+        for i in range(1, close.shape[0]):
+            c = close[i]
+            ef += kf * (c - ef)
+            es += ks * (c - es)
+            d = c - close[i - 1]
+            ad = abs(d)
+            gain = (d + ad) * 0.5
+            loss = (ad - d) * 0.5
+            if i <= nr:
+                avg_gain += gain / nr
+                avg_loss += loss / nr
+            else:
+                avg_gain = (avg_gain * (nr - 1) + gain) / nr
+                avg_loss = (avg_loss * (nr - 1) + loss) / nr
+        return ef, es, avg_gain, avg_loss
+
+    @njit(cache=True, fastmath=True)
+    def _atr_nb(high, low, close, n):
+        m = high.shape[0]
+        total = 0.0
+        for i in range(m - n, m):
+            total += max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        return total / n
+
+def warm_kernels() -> None:
+    """Compile (or load from cache) the JIT kernels before the first scan."""
+    if not HAVE_NUMBA:
+        return
+    x = np.array([1.0, 2.0])
+    _indicators_nb(x, 1, 1, 1)
+    _atr_nb(x, x, x, 1)
+
+def ema_last(values: np.ndarray, length: int) -> Optional[float]:
+    """Final EMA value, seeded with the first value."""
+    x = np.ascontiguousarray(values, dtype=np.float64)
+    if len(x) < length:
+        return None
     k = 2 / (length + 1)
-    out = [values[0]]
-    for x in values[1:]:
-        out.append(out[-1] + k * (x - out[-1]))
-    return out
-
-def rsi(values: List[float], length: int) -> List[float]:
-    if len(values) < length + 1:
-        return []
-    gains, losses = [], []
-    for i in range(1, len(values)):
-        d = values[i] - values[i - 1]
-        gains.append(max(d, 0.0))
-        losses.append(max(-d, 0.0))
-    # Wilder smoothing
-    avg_gain = sum(gains[:length]) / length
-    avg_loss = sum(losses[:length]) / length
-    out = [50.0] * (length)  # padding for alignment
-    for i in range(length, len(gains)):
-        avg_gain = (avg_gain * (length - 1) + gains[i]) / length
-        avg_loss = (avg_loss * (length - 1) + losses[i]) / length
-        rs = (avg_gain / avg_loss) if avg_loss > 0 else 999999.0
-        out.append(100 - (100 / (1 + rs)))
-    return out
+    # y[i] = k*x[i] + (1-k)*y[i-1], seeded so that y[0] == x[0]
+    out, _ = lfilter([k], [1.0, k - 1.0], x, zi=[(1 - k) * x[0]])
+    return float(out[-1])
+
+def wilder_avgs(values: np.ndarray, length: int) -> Optional[Tuple[float, float]]:
+    """Final Wilder-smoothed (avg_gain, avg_loss) of the close-to-close moves."""
+    x = np.ascontiguousarray(values, dtype=np.float64)
+    if len(x) < length + 1:
+        return None
+    d = np.diff(x)
+    ad = np.abs(d)
+    # rows: gains, losses -- split without branches as (d +/- |d|) / 2
+    moves = np.stack(((d + ad) * 0.5, (ad - d) * 0.5))
+    # Wilder smoothing, seeded with the simple mean of the first `length` moves
+    a = (length - 1) / length
+    avgs = moves[:, :length].mean(axis=1)
+    if len(d) > length:
+        avgs = lfilter([1 / length], [1.0, -a], moves[:, length:], zi=(a * avgs)[:, None])[0][:, -1]
+    return float(avgs[0]), float(avgs[1])
+
+def indicator_avgs(values: np.ndarray, fast: int, slow: int,
+                   rsi_len: int) -> Optional[Tuple[float, float, float, float]]:
+    """Final (ema_fast, ema_slow, avg_gain, avg_loss), in one pass over `values` when JIT is available."""
+    x = np.ascontiguousarray(values, dtype=np.float64)
+    if len(x) < max(fast, slow, rsi_len + 1):
+        return None
+    if HAVE_NUMBA:
+        ef, es, avg_gain, avg_loss = _indicators_nb(x, fast, slow, rsi_len)
+        return float(ef), float(es), float(avg_gain), float(avg_loss)
+    avg_gain, avg_loss = wilder_avgs(x, rsi_len)
+    return ema_last(x, fast), ema_last(x, slow), avg_gain, avg_loss
 
-def true_range(c_prev: float, h: float, l: float) -> float:
-    return max(h - l, abs(h - c_prev), abs(l - c_prev))
+def rsi_from_avgs(avg_gain: float, avg_loss: float) -> float:
+    rs = (avg_gain / avg_loss) if avg_loss > 0 else 999999.0
+    return 100 - (100 / (1 + rs))
 
-def atr(candles: List[Dict[str, float]], length: int) -> Optional[float]:
+def atr(candles: np.ndarray, length: int) -> Optional[float]:
     if len(candles) < length + 1:
         return None
-    trs = []
-    for i in range(1, len(candles)):
-        trs.append(true_range(candles[i - 1]["c"], candles[i]["h"], candles[i]["l"]))
+    if HAVE_NUMBA:
+        return float(_atr_nb(candles[:, COL_H], candles[:, COL_L], candles[:, COL_C], length))
+    h = candles[1:, COL_H]
+    l = candles[1:, COL_L]
+    prev_c = candles[:-1, COL_C]
+    trs = np.maximum.reduce([h - l, np.abs(h - prev_c), np.abs(l - prev_c)])
     # simple ATR is fine for MVP
-    return sum(trs[-length:]) / length
+    return float(trs[-length:].mean())
+
+class IndicatorState:
+    """
+    EMA/RSI recurrences over closed candles, advanced in O(1) per candle.
+    Bulk kernels are only used to warm it up from a candle buffer.
+    """
+    FIELDS = ("ema_fast", "ema_slow", "avg_gain", "avg_loss", "prev_close", "t", "n_warmed")
+
+    def __init__(self, ema_fast: float, ema_slow: float, avg_gain: float, avg_loss: float,
+                 prev_close: float, t: float, n_warmed: int) -> None:
+        self.ema_fast = ema_fast
+        self.ema_slow = ema_slow
+        self.avg_gain = avg_gain
+        self.avg_loss = avg_loss
+        self.prev_close = prev_close
+        self.t = t  # start time (ms) of the last folded-in candle
+        self.n_warmed = n_warmed
+
+    @classmethod
+    def warm(cls, closed: np.ndarray) -> Optional["IndicatorState"]:
+        closes = closed[:, COL_C]
+        avgs = indicator_avgs(closes, EMA_FAST, EMA_SLOW, RSI_LEN)
+        if avgs is None:
+            return None
+        return cls(*avgs, float(closes[-1]), float(closed[-1, COL_T]), len(closed))
+
+    @classmethod
+    def resume(cls, prev: Optional["IndicatorState"], closed: np.ndarray) -> Optional["IndicatorState"]:
+        """Roll `prev` forward over `closed` if it ends on one of its candles, else warm up."""
+        if prev is not None:
+            hit = np.flatnonzero(closed[:, COL_T] == prev.t)
+            if len(hit):
+                for row in closed[hit[0] + 1:]:
+                    prev.update(row[COL_C], row[COL_T])
+                return prev
+        return cls.warm(closed)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, float]) -> "IndicatorState":
+        return cls(*(d[f] for f in cls.FIELDS))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def _step(self, close: float) -> Tuple[float, float, float, float]:
+        d = close - self.prev_close
+        ad = abs(d)
+        k_fast = 2 / (EMA_FAST + 1)
+        k_slow = 2 / (EMA_SLOW + 1)
+        return (
+            self.ema_fast + k_fast * (close - self.ema_fast),
+            self.ema_slow + k_slow * (close - self.ema_slow),
+            (self.avg_gain * (RSI_LEN - 1) + (d + ad) * 0.5) / RSI_LEN,
+            (self.avg_loss * (RSI_LEN - 1) + (ad - d) * 0.5) / RSI_LEN,
+        )
+
+    def update(self, close: float, t: float) -> None:
+        close = float(close)
+        self.ema_fast, self.ema_slow, self.avg_gain, self.avg_loss = self._step(close)
+        self.prev_close = close
+        self.t = float(t)
+        self.n_warmed += 1
+
+    def values(self, close: Optional[float] = None) -> Tuple[float, float, float]:
+        """(ema_fast, ema_slow, rsi) as of the last closed candle, or with `close` as the next one."""
+        if close is None:
+            return self.ema_fast, self.ema_slow, rsi_from_avgs(self.avg_gain, self.avg_loss)
+        ef, es, avg_gain, avg_loss = self._step(float(close))
+        return ef, es, rsi_from_avgs(avg_gain, avg_loss)
 
 # =========================
 # SETUP LOGIC
 # =========================
 def compute_setup(symbol: str) -> Optional[Dict[str, Any]]:
-    candles = bybit_klines(symbol, TF, limit=250)
-    if len(candles) < 120:
-        return None
-
-    closes = [c["c"] for c in candles]
-    ema_fast = ema(closes, EMA_FAST)
-    ema_slow = ema(closes, EMA_SLOW)
-    r = rsi(closes, RSI_LEN)
-    a = atr(candles, ATR_LEN)
-
-    if not ema_fast or not ema_slow or not r or a is None:
+    with BUF_LOCK:
+        ind = IND.get(symbol)
+        closed = CANDLES.get(symbol)
+        live = LIVE.get(symbol)
+        if symbol not in SEEDED or ind is None or closed is None or ind.n_warmed < 120:
+            return None
+        # indicators as of the latest price: the forming candle if any
+        ef, es, rv = ind.values(None if live is None else live[COL_C])
+        recent = closed.tail(ATR_LEN + 1)
+    if live is not None:  # slide the forming candle in as the newest row
+        recent[:-1] = recent[1:]
+        recent[-1] = live
+    a = atr(recent, ATR_LEN)
+    if a is None:
         return None
 
-    # align indices: ema outputs full length (starting from first), rsi padded;
-    # use last values safely
-    price = closes[-1]
-    ef = ema_fast[-1]
-    es = ema_slow[-1]
-    rv = r[-1]
+    price = float(recent[-1, COL_C])
 
     gap_pct = abs(ef - es) / price
 
@@ -246,27 +762,22 @@ def compute_setup(symbol: str) -> Optional[Dict[str, Any]]:
         sl = entry + sl_dist
         tp = entry - sl_dist * TP_RR
 
-    # Round nicely
-    def r6(x: float) -> float:
-        if x == 0:
-            return 0.0
-        # dynamic rounding
-        p = max(0, 6 - int(math.floor(math.log10(abs(x)))) - 1)
-        return round(x, min(max(p, 2), 6))
+    # Round to the symbol's tick precision
+    dec = price_decimals(symbol)
 
     return {
         "symbol": symbol,
         "tf": TF,
         "side": side,
-        "entry": r6(entry),
-        "sl": r6(sl),
-        "tp": r6(tp),
-        "ema_fast": r6(ef),
-        "ema_slow": r6(es),
+        "entry": round(entry, dec),
+        "sl": round(sl, dec),
+        "tp": round(tp, dec),
+        "ema_fast": round(ef, dec),
+        "ema_slow": round(es, dec),
         "rsi": round(rv, 1),
         "reason": reason,
         "ts": int(time.time()),
-        "t_ms": candles[-1]["t"],
+        "t_ms": int(recent[-1, COL_T]),
     }
 
 def format_setup(sig: Dict[str, Any]) -> str:
@@ -295,8 +806,8 @@ def format_setup(sig: Dict[str, Any]) -> str:
 # =========================
 # STATS EVALUATION
 # =========================
-def local_now() -> datetime:
-    return datetime.now(timezone.utc) + timedelta(hours=TZ_OFFSET_HOURS)
+def local_now(now_ts: int) -> datetime:
+    return datetime.fromtimestamp(now_ts, timezone.utc) + timedelta(hours=TZ_OFFSET_HOURS)
 
 def yyyy_mm_dd(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d")
@@ -315,48 +826,45 @@ def eval_signal_hit(sig: Dict[str, Any]) -> str:
     sl = float(sig["sl"])
 
     # fetch recent klines; Bybit doesn't accept startTime in this endpoint easily for all cases,
-    # so we pull a chunk and filter by time.
-    candles = bybit_klines(symbol, TF, limit=200)
-    if not candles:
+    # so we pull a chunk and filter by time (cached: one fetch per symbol per stats pass).
+    candles = recent_klines(symbol, TF, limit=STATS_KLINES_LIMIT)
+    if not len(candles):
         return "OPEN"
 
-    relevant = [c for c in candles if c["t"] >= entry_ts]
-    if not relevant:
-        relevant = candles[-80:]
-
-    for c in relevant:
-        hi = c["h"]
-        lo = c["l"]
-        # In same candle, if both touched, treat as LOSS (conservative)
-        if side == "LONG":
-            tp_hit = hi >= tp
-            sl_hit = lo <= sl
-            if tp_hit and sl_hit:
-                return "LOSS"
-            if sl_hit:
-                return "LOSS"
-            if tp_hit:
-                return "WIN"
-        else:
-            tp_hit = lo <= tp
-            sl_hit = hi >= sl
-            if tp_hit and sl_hit:
-                return "LOSS"
-            if sl_hit:
-                return "LOSS"
-            if tp_hit:
-                return "WIN"
+    t = candles[:, COL_T]
+    start = int(np.searchsorted(t, entry_ts))
+    if start >= len(t):
+        start = max(len(t) - 80, 0)
+    highs = candles[start:, COL_H]
+    lows = candles[start:, COL_L]
 
+    if side == "LONG":
+        tp_mask = highs >= tp
+        sl_mask = lows <= sl
+    else:
+        tp_mask = lows <= tp
+        sl_mask = highs >= sl
+
+    # index of the first candle touching each level (len when never touched)
+    n = len(highs)
+    first_tp = int(np.argmax(tp_mask)) if tp_mask.any() else n
+    first_sl = int(np.argmax(sl_mask)) if sl_mask.any() else n
+
+    # In same candle, if both touched, treat as LOSS (conservative)
+    if first_sl < n and first_sl <= first_tp:
+        return "LOSS"
+    if first_tp < n:
+        return "WIN"
     return "OPEN"
 
-def send_daily_stats(state: Dict[str, Any]) -> None:
-    today = yyyy_mm_dd(local_now())
+def send_daily_stats(state: Dict[str, Any], now_ts: int) -> None:
+    now = local_now(now_ts)
+    today = yyyy_mm_dd(now)
     last = state.get("daily", {}).get("last_stats_date", "")
     if last == today:
         return
 
     # only send after 21:00 local
-    now = local_now()
     if (now.hour, now.minute) < (DAILY_STATS_HOUR, DAILY_STATS_MINUTE):
         return
 
@@ -366,15 +874,23 @@ def send_daily_stats(state: Dict[str, Any]) -> None:
     start_ts = int(start_local.timestamp())
     end_ts = int(end_local.timestamp())
 
-    sigs = state.get("signals", [])
-    todays = [s for s in sigs if start_ts <= int(s.get("ts", 0)) < end_ts]
+    todays = load_signals(start_ts, end_ts)
+
+    # fetch each symbol's klines once, all symbols at the same time;
+    # eval_signal_hit below is then served from the kline cache
+    futures = {
+        SCAN_POOL.submit(recent_klines, sym, TF, STATS_KLINES_LIMIT): sym
+        for sym in {s["symbol"] for s in todays}
+    }
+    for fut in as_completed(futures):
+        if not len(fut.result()):
+            print("daily stats: no klines for", futures[fut])
 
     wins = 0
     losses = 0
     open_ = 0
     for s in todays:
         res = eval_signal_hit(s)
-        s["result"] = res
         if res == "WIN":
             wins += 1
         elif res == "LOSS":
@@ -399,8 +915,9 @@ def send_daily_stats(state: Dict[str, Any]) -> None:
             "Критерій: якщо ціна хоч раз торкнулась TP/SL — зараховано."
         )
 
-    tg_send(text)
+    tg_enqueue(text)
     state.setdefault("daily", {})["last_stats_date"] = today
+    mark_dirty()
 
 # =========================
 # MAIN LOOP
@@ -409,10 +926,14 @@ def announce_start() -> None:
     coins = "/".join([s.replace("USDT", "") for s in SYMBOLS])
     tf = f"{TF}m"
     # No "bot", no platform naming
-    tg_send(f"✅ Моніторинг активовано — {tf} сетапи по {coins}")
+    tg_enqueue(f"✅ Моніторинг активовано — {tf} сетапи по {coins}")
 
 def scanner_loop() -> None:
     state = load_state()
+    threading.Thread(target=tg_worker, daemon=True).start()
+    threading.Thread(target=state_worker, daemon=True).start()
+    warm_kernels()
+    threading.Thread(target=ws_loop, args=(state.get("indicators", {}),), daemon=True).start()
     announce_start()
 
     while True:
@@ -420,11 +941,13 @@ def scanner_loop() -> None:
 
         # daily stats
         try:
-            send_daily_stats(state)
+            send_daily_stats(state, now_ts)
         except Exception as e:
             print("daily stats error:", e)
 
-        # scan symbols
+        # scan symbols (candles come from the stream buffers, no HTTP here)
+        pending: List[str] = []
+        new_signals: List[Dict[str, Any]] = []
         for sym in SYMBOLS:
             try:
                 sig = compute_setup(sym)
@@ -435,19 +958,31 @@ def scanner_loop() -> None:
                 if not cooldown_ok(state, key, now_ts):
                     continue
 
-                # send setup
-                tg_send(format_setup(sig))
-
-                # store for stats
-                state.setdefault("signals", []).append(sig)
+                # queue setup, store for stats
+                pending.append(format_setup(sig))
+                new_signals.append(sig)
                 mark_sent(state, key, now_ts)
-                save_state(state)
-
-                time.sleep(0.25)
             except Exception as e:
                 print("scan error:", sym, e)
 
-        time.sleep(CHECK_EVERY_SEC)
+        # one Telegram call for everything found this scan (sent in the background)
+        if pending:
+            tg_send_batch(pending)
+            append_signals(new_signals)
+
+        # persist indicator state (changes once per closed candle) for restarts
+        ind = indicator_snapshot()
+        if ind != state.get("indicators"):
+            state["indicators"] = ind
+            mark_dirty()
+
+        # one state write per scan, and none when nothing changed
+        if _state_dirty:
+            save_state(state)
+
+        # next scan after CHECK_EVERY_SEC, or as soon as a candle closes
+        CANDLE_CLOSED.wait(CHECK_EVERY_SEC)
+        CANDLE_CLOSED.clear()
 
 if __name__ == "__main__":
     scanner_loop()